@@ -0,0 +1,178 @@
+"""
+Shared, lazy setup of the external clients used by the backend and the helper scripts.
+
+Nothing is initialized or heavily imported at import time. The first call to get_db(),
+get_auth(), get_openai_client() or get_vectorizer() does the (slow) import and setup, and every later call in the same
+process reuses that client, so Firestore's gRPC channel and OpenAI's HTTP connections
+are opened once and kept alive instead of being re-established for every script or round.
+
+Set TENORWISP_LOCAL="true" to work without production credentials:
+  - Firestore and Auth point at the Firebase emulators (`firebase emulators:start`),
+    at FIRESTORE_EMULATOR_HOST / FIREBASE_AUTH_EMULATOR_HOST (default 127.0.0.1:8080 / 127.0.0.1:9099).
+  - OpenAI calls are answered by a local stand-in that returns canned text, so no API key is needed.
+"""
+
+import os
+import json
+import threading
+from types import SimpleNamespace
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Bootstrap Configuration ---
+LOCAL_MODE = os.getenv("TENORWISP_LOCAL", "false").lower() == "true"
+# Project id used for the emulators (matches .firebaserc).
+LOCAL_PROJECT_ID = os.getenv("GCLOUD_PROJECT", "tenorwisp")
+# Keep-alive pool for OpenAI requests. A round makes a few sequential calls; scripts make many.
+OPENAI_MAX_CONNECTIONS = 10
+OPENAI_KEEPALIVE_SECONDS = 60
+OPENAI_TIMEOUT_SECONDS = 60
+
+_lock = threading.Lock()
+_vectorizer_lock = threading.Lock()
+_db = None
+_openai_client = None
+_vectorizers = {}
+
+
+def get_firebase_app():
+    """Initializes the default Firebase app on first use and returns it."""
+    import firebase_admin
+    from firebase_admin import credentials
+
+    with _lock:
+        if firebase_admin._apps:
+            return firebase_admin.get_app()
+
+        print("Initializing Firebase...")
+        if LOCAL_MODE:
+            os.environ.setdefault("FIRESTORE_EMULATOR_HOST", "127.0.0.1:8080")
+            os.environ.setdefault("FIREBASE_AUTH_EMULATOR_HOST", "127.0.0.1:9099")
+            print(f"   - Local mode: using the Firebase emulators at {os.environ['FIRESTORE_EMULATOR_HOST']}.")
+            app = firebase_admin.initialize_app(_emulator_credential(), {"projectId": LOCAL_PROJECT_ID})
+            print("✅ Firebase initialized successfully.")
+            return app
+
+        service_account_json_str = os.getenv("FIREBASE_SERVICE_ACCOUNT_JSON")
+        if service_account_json_str:
+            # Production: From environment variable on Railway
+            print("   - Using service account from environment variable.")
+            service_account_info = json.loads(service_account_json_str)
+            cred = credentials.Certificate(service_account_info)
+        else:
+            # Development: From local file path in .env
+            print("   - Using service account from local file path (GOOGLE_APPLICATION_CREDENTIALS).")
+            if not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
+                raise ValueError("GOOGLE_APPLICATION_CREDENTIALS not set for local development.")
+            cred = credentials.ApplicationDefault()
+
+        app = firebase_admin.initialize_app(cred)
+        print("✅ Firebase initialized successfully.")
+        return app
+
+
+def get_db():
+    """Returns the process-wide Firestore client, creating it on first use."""
+    global _db
+    if _db is None:
+        app = get_firebase_app()
+        from firebase_admin import firestore
+        with _lock:
+            if _db is None:
+                _db = firestore.client(app)
+    return _db
+
+
+def get_auth():
+    """Returns the firebase_admin.auth module, initializing the Firebase app first."""
+    get_firebase_app()
+    from firebase_admin import auth
+    return auth
+
+
+def get_server_timestamp():
+    """Returns Firestore's SERVER_TIMESTAMP sentinel without importing Firestore up front."""
+    from firebase_admin import firestore
+    return firestore.SERVER_TIMESTAMP
+
+
+def get_openai_client():
+    """Returns the process-wide OpenAI client (or the local stand-in), creating it on first use."""
+    global _openai_client
+    if _openai_client is None:
+        with _lock:
+            if _openai_client is None:
+                _openai_client = _create_openai_client()
+    return _openai_client
+
+
+def get_vectorizer(model_name):
+    """Returns a SentenceTransformer for model_name, loading it (and torch) on first use."""
+    with _vectorizer_lock:
+        if model_name not in _vectorizers:
+            from sentence_transformers import SentenceTransformer
+            print(f"Loading Sentence Transformer model '{model_name}'...")
+            _vectorizers[model_name] = SentenceTransformer(model_name)
+            print("✅ Model loaded.")
+        return _vectorizers[model_name]
+
+
+def _create_openai_client():
+    if LOCAL_MODE:
+        print("Initializing OpenAI API... (local mode: using the offline stand-in)")
+        return _LocalOpenAIClient()
+
+    import httpx
+    import openai
+
+    print("Initializing OpenAI API...")
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY environment variable not set.")
+
+    http_client = httpx.Client(
+        timeout=OPENAI_TIMEOUT_SECONDS,
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_SECONDS,
+        ),
+    )
+    client = openai.OpenAI(api_key=api_key, http_client=http_client)
+    print("✅ OpenAI API initialized.")
+    return client
+
+
+def _emulator_credential():
+    """The emulators accept any credentials, so skip looking for a service account."""
+    from firebase_admin import credentials
+    from google.auth.credentials import AnonymousCredentials
+
+    class EmulatorCredential(credentials.Base):
+        def get_credential(self):
+            return AnonymousCredentials()
+
+    return EmulatorCredential()
+
+
+class _LocalOpenAIClient:
+    """
+    Offline stand-in for openai.OpenAI covering the one call this project makes:
+    chat.completions.create(). Returns JSON when JSON mode is requested, plain text otherwise.
+    """
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_chat_completion))
+
+    def _create_chat_completion(self, model=None, messages=(), response_format=None, **kwargs):
+        user_message = messages[-1]["content"] if messages else ""
+        if response_format and response_format.get("type") == "json_object":
+            content = json.dumps({
+                "title": "[local] What do these submissions have in common?",
+                "initial_post": f"[local stand-in for {model}] {user_message[:200]}",
+            })
+        else:
+            content = f"[local] {user_message[:200]}"
+        message = SimpleNamespace(role="assistant", content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")])
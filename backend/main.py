@@ -1,38 +1,38 @@
 import os
+import sys
 import json
-from fastapi import FastAPI, Depends, HTTPException, status
+import asyncio
+import tracemalloc
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import List, Optional
+from fastapi import FastAPI, Depends, HTTPException, Query, status
 from fastapi.security import APIKeyHeader
-from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
-import openai
-from sentence_transformers import SentenceTransformer
-import hdbscan
-import numpy as np
 
-# Load environment variables from a .env file (for local development)
-load_dotenv()
+# Make sibling modules importable whether the app is started from the repo root
+# (`uvicorn backend.main:app`) or from inside backend/ (Railway's Procfile).
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bootstrap import get_db, get_openai_client, get_vectorizer, get_server_timestamp
+from profiling import make_profiler
+from pipeline import (
+    EMBEDDING_MODEL_NAME,
+    DEFAULT_MIN_CLUSTER_SIZE,
+    fetch_live_submissions,
+    count_live_submissions_since,
+    encode_texts,
+    cluster_embeddings,
+    group_by_cluster,
+    select_top_clusters,
+    build_prompts,
+)
+from preview import MAX_MIN_CLUSTER_SIZES_PER_PREVIEW, run_preview
+from scheduler import RoundScheduler, RoundInProgressError
 
 # --- Firebase Admin SDK Initialization ---
+# bootstrap.get_db() loads .env, initializes Firebase once and keeps one Firestore client
+# (and its gRPC channel) for the whole process.
 try:
-    print("Initializing Firebase...")
-    service_account_json_str = os.getenv("FIREBASE_SERVICE_ACCOUNT_JSON")
-    if service_account_json_str:
-        # Production: From environment variable on Railway
-        print("   - Using service account from environment variable.")
-        service_account_info = json.loads(service_account_json_str)
-        cred = credentials.Certificate(service_account_info)
-    else:
-        # Development: From local file path in .env
-        print("   - Using service account from local file path (GOOGLE_APPLICATION_CREDENTIALS).")
-        # This automatically finds the credentials from the GOOGLE_APPLICATION_CREDENTIALS
-        # environment variable loaded by load_dotenv().
-        if not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
-             raise ValueError("GOOGLE_APPLICATION_CREDENTIALS not set for local development.")
-        cred = credentials.ApplicationDefault()
-
-    firebase_admin.initialize_app(cred)
-    print("✅ Firebase initialized successfully.")
+    get_db()
 except Exception as e:
     print(f"❌ Error initializing Firebase: {e}")
     # Exit if Firebase fails to initialize, as it's critical
@@ -42,15 +42,9 @@ except Exception as e:
 # Load models once when the server starts to avoid reloading on every request
 vectorizer = None
 try:
-    print("Loading Sentence Transformer model...")
-    vectorizer = SentenceTransformer('all-MiniLM-L6-v2')
-    print("✅ Model loaded.")
-
-    print("Initializing OpenAI API...")
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    if not openai.api_key:
-        raise ValueError("OPENAI_API_KEY environment variable not set.")
-    print("✅ OpenAI API initialized.")
+    vectorizer = get_vectorizer(EMBEDDING_MODEL_NAME)
+    # Creates the shared keep-alive OpenAI client up front so a missing key is reported at startup.
+    get_openai_client()
 except Exception as e:
     print(f"❌ Error during model initialization: {e}")
     # We can choose to exit or let the app run without AI models
@@ -59,11 +53,46 @@ except Exception as e:
     pass
 
 
+# --- Round Scheduling ---
+# When the most recent round fetched its submissions, so the scheduler can tell what's new.
+# Starts at the server's start time, so a restart or redeploy doesn't immediately trigger a round.
+last_round_started_at = datetime.now(timezone.utc)
+
+
+def count_new_live_submissions():
+    """Counts live submissions created since the last round fetched its submissions."""
+    return count_live_submissions_since(get_db(), last_round_started_at)
+
+
+# All scheduling is off unless ROUND_SCHEDULE_CRON and/or ROUND_NEW_SUBMISSIONS_THRESHOLD are set.
+# ROUND_SCHEDULE_CRON is a standard 5-field cron expression evaluated in UTC, e.g. "0 */6 * * *".
+round_scheduler = RoundScheduler(
+    scheduled_round=lambda: run_generation_round(make_profiler(None)),
+    count_new_submissions=count_new_live_submissions,
+    cron=os.getenv("ROUND_SCHEDULE_CRON"),
+    new_submissions_threshold=int(os.getenv("ROUND_NEW_SUBMISSIONS_THRESHOLD", "0")),
+    poll_seconds=int(os.getenv("ROUND_SCHEDULER_POLL_SECONDS", "60")),
+    jitter_seconds=int(os.getenv("ROUND_SCHEDULER_JITTER_SECONDS", "30")),
+    min_gap_seconds=int(os.getenv("ROUND_MIN_GAP_SECONDS", "300")),
+)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global last_round_started_at
+    # Submissions already live at startup don't count toward the scheduler's triggers.
+    last_round_started_at = datetime.now(timezone.utc)
+    round_scheduler.start()
+    yield
+    await round_scheduler.stop()
+
+
 # --- App Configuration ---
 app = FastAPI(
     title="AI Topic Generator API",
     description="Backend service for processing submissions and generating topics.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # --- Security: API Key Authentication ---
@@ -92,34 +121,75 @@ def read_root():
 
 # THIS IS OUR MAIN ENDPOINT FOR THE DEMO
 @app.post("/api/admin/start_generation_round", dependencies=[Depends(get_api_key)])
-async def trigger_generation_round():
+async def trigger_generation_round(
+    profile: Optional[str] = Query(
+        None,
+        description="Run the round under a profiler: 'cpu' (sampled collapsed stacks) or 'memory' (tracemalloc).",
+    ),
+):
     """
     An admin-only endpoint to manually trigger the topic generation process.
+    Pass ?profile=cpu or ?profile=memory to get a per-stage profile back with the result.
+    """
+    print("✅ Admin trigger received!")
+
+    try:
+        profiler = make_profiler(profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if profile:
+        print(f"⏱️ Profiling this round in '{profile}' mode.")
+
+    try:
+        result = await round_scheduler.run_round(run_profiled_round, profiler)
+    except RoundInProgressError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except HTTPException as e:
+        # A failing round is often the one worth diagnosing, so keep its profile too.
+        profile_report = profiler.report()
+        if profile_report is None:
+            raise
+        raise HTTPException(status_code=e.status_code, detail={"message": e.detail, "profile": profile_report})
+
+    profile_report = profiler.report()
+    if profile_report is not None:
+        result["profile"] = profile_report
+    return result
+
+
+def run_profiled_round(profiler):
+    """Runs a round with the profiler attached to the current (worker) thread."""
+    profiler.start()
+    try:
+        return run_generation_round(profiler)
+    finally:
+        profiler.stop()
+
+
+def run_generation_round(profiler):
+    """
+    Runs one full generation round: fetch, encode, cluster, generate and publish.
+    Each stage is wrapped in profiler.stage() so a profiled round can be broken down by stage.
     """
-    print("✅ Admin trigger received! Starting topic generation process...")
+    global last_round_started_at
+    from openai import APIError  # Deferred like the rest of the OpenAI client setup
+    print("✅ Starting topic generation process...")
 
     if not vectorizer:
         print("❌ AI models not loaded. Aborting process.")
         raise HTTPException(status_code=500, detail="AI models are not available.")
 
     # 1. Fetch live submissions from Firestore
-    db = firestore.client()
-    submissions_to_process = []
+    db = get_db()
 
     try:
         print("1. Fetching live submissions from Firestore...")
-        live_submissions_ref = db.collection('submissions').where('status', '==', 'live')
-        docs = live_submissions_ref.stream()
-
-        for doc in docs:
-            doc_data = doc.to_dict()
-            # Basic validation to ensure the submission has the required data
-            if doc_data.get("submissionText") and doc_data.get("author_uid"):
-                submissions_to_process.append({
-                    "id": doc.id,
-                    "text": doc_data.get("submissionText"),
-                    "author_uid": doc_data.get("author_uid")
-                })
+        # Taken before the fetch, so submissions created while this round runs still count as new.
+        fetch_started_at = datetime.now(timezone.utc)
+        with profiler.stage("fetch"):
+            submissions_to_process = fetch_live_submissions(db)
+        last_round_started_at = fetch_started_at
 
         if not submissions_to_process:
             print("   - No live submissions found. Exiting process.")
@@ -140,23 +210,17 @@ async def trigger_generation_round():
 
         # Vectorize the text
         print("   - Vectorizing texts...")
-        embeddings = vectorizer.encode(texts)
+        with profiler.stage("encode"):
+            embeddings = encode_texts(vectorizer, texts)
 
         # Cluster the embeddings
-        # min_cluster_size is a key parameter to tune. A smaller value finds more, smaller topics.
         print("   - Clustering vectors...")
-        clusterer = hdbscan.HDBSCAN(min_cluster_size=3, metric='euclidean', gen_min_span_tree=True)
-        cluster_labels = clusterer.fit_predict(embeddings)
+        with profiler.stage("cluster"):
+            cluster_labels, _ = cluster_embeddings(embeddings, min_cluster_size=DEFAULT_MIN_CLUSTER_SIZE)
 
         # Group submissions by their new cluster label
-        clustered_submissions = {}
-        for i, label in enumerate(cluster_labels):
-            if label == -1:
-                continue  # Ignore noise points
-            if label not in clustered_submissions:
-                clustered_submissions[label] = []
-            clustered_submissions[label].append(submissions_to_process[i])
-        
+        clustered_submissions = group_by_cluster(submissions_to_process, cluster_labels)
+
         if not clustered_submissions:
             print("   - Analysis complete, but no significant clusters were found. Exiting.")
             return {"status": "success", "message": "Analysis complete, but no clusters were formed."}
@@ -170,39 +234,24 @@ async def trigger_generation_round():
     # 3. Generate: For top clusters, use LLM to create thread title and post
     print("3. Generating content for top clusters...")
 
-    # Sort clusters by size to process the most popular topics
-    sorted_clusters = sorted(clustered_submissions.items(), key=lambda item: len(item[1]), reverse=True)
-
-    # Process the top 3 clusters (or fewer if there aren't that many)
-    for cluster_id, submissions_in_cluster in sorted_clusters[:3]:
+    # Process the largest clusters first (or fewer if there aren't that many)
+    for cluster_id, submissions_in_cluster in select_top_clusters(clustered_submissions):
         print(f"   - Processing cluster {cluster_id} with {len(submissions_in_cluster)} members...")
 
-        # Consolidate text for the LLM prompt
-        consolidated_text = "\\n---\\n".join([sub['text'] for sub in submissions_in_cluster])
-
         # Build a detailed prompt using the OpenAI Chat Completions format
-        system_prompt = "You are a community moderator. Your goal is to synthesize user ideas into engaging discussion topics."
-        user_prompt = (
-            "Based on the following user thoughts, all centered on a similar theme, perform two tasks:\n"
-            "1. Create a single, neutral, open-ended discussion question that captures the core idea.\n"
-            "2. Write a short, engaging initial post to kick off the thread, referencing the collective thought.\n\n"
-            "The user thoughts are:\n"
-            "---\n"
-            f"{consolidated_text}\n"
-            "---\n\n"
-            'Format your entire response as a single, valid JSON object with two keys: "title" and "initial_post".'
-        )
+        system_prompt, user_prompt = build_prompts(submissions_in_cluster)
 
         try:
             # Generate content using OpenAI's API
-            response = openai.chat.completions.create(
-                model="gpt-4.1-2025-04-14",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                response_format={"type": "json_object"}  # Use JSON mode for reliable output
-            )
+            with profiler.stage("generate"):
+                response = get_openai_client().chat.completions.create(
+                    model="gpt-4.1-2025-04-14",
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    response_format={"type": "json_object"}  # Use JSON mode for reliable output
+                )
 
             # The response content is a JSON string, so we parse it.
             response_content = response.choices[0].message.content
@@ -223,7 +272,7 @@ async def trigger_generation_round():
             new_thread_ref = db.collection('public_threads').document()
             batch.set(new_thread_ref, {
                 'title': thread_title,
-                'generatedAt': firestore.SERVER_TIMESTAMP  # Add timestamp for sorting
+                'generatedAt': get_server_timestamp()  # Add timestamp for sorting
             })
 
             # Create the initial post in the `posts` sub-collection
@@ -233,7 +282,7 @@ async def trigger_generation_round():
                 'author_uid': None, # Explicitly null for AI posts
                 'author_username': 'Thread Starter',
                 'author_photoURL': "https://api.dicebear.com/8.x/bottts/svg", # A generic bot icon
-                'createdAt': firestore.SERVER_TIMESTAMP # Add timestamp for sorting
+                'createdAt': get_server_timestamp() # Add timestamp for sorting
             })
 
             # 5. Archive: Mark all processed submissions as "archived"
@@ -248,16 +297,77 @@ async def trigger_generation_round():
 
             # Commit the entire batch of operations
             try:
-                batch.commit()
+                with profiler.stage("publish"):
+                    batch.commit()
                 print(f"   - ✅ Successfully published thread and archived {len(submissions_in_cluster)} submissions.")
             except Exception as e:
                 print(f"   - ❌ Error committing batch for cluster {cluster_id}: {e}")
                 # If the batch fails, we should continue to the next cluster
                 continue
 
-        except (json.JSONDecodeError, KeyError, openai.APIError) as e:
+        except (json.JSONDecodeError, KeyError, APIError) as e:
             print(f"     - ❌ Error processing LLM response for cluster {cluster_id}: {e}")
             continue  # Skip to the next cluster if one fails
 
 
-    return {"status": "success", "message": "Topic generation process completed."} 
+    return {"status": "success", "message": "Topic generation process completed."}
+
+
+@app.post("/api/admin/preview_generation_round", dependencies=[Depends(get_api_key)])
+async def preview_generation_round(
+    min_cluster_size: List[int] = Query(
+        [DEFAULT_MIN_CLUSTER_SIZE],
+        description="One or more min_cluster_size values to try, e.g. ?min_cluster_size=3&min_cluster_size=5.",
+    ),
+):
+    """
+    An admin-only dry run of the generation round. Fetches, encodes and clusters the live
+    submissions and returns the threads that would be created, without calling the LLM,
+    publishing threads or archiving submissions. Embeddings and cluster results are cached
+    per snapshot of live submission ids, so parameter sweeps only recompute what changed.
+    """
+    print("🔍 Preview requested! Running generation round without publishing...")
+
+    if not vectorizer:
+        print("❌ AI models not loaded. Aborting preview.")
+        raise HTTPException(status_code=500, detail="AI models are not available.")
+
+    if tracemalloc.is_tracing():
+        # tracemalloc sees the whole process, so a preview would be counted in the round's memory profile.
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="A memory-profiled round is running. Try the preview again when it finishes.")
+
+    if len(min_cluster_size) > MAX_MIN_CLUSTER_SIZES_PER_PREVIEW:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {MAX_MIN_CLUSTER_SIZES_PER_PREVIEW} min_cluster_size values can be previewed at once.")
+
+    if any(size < 2 for size in min_cluster_size):
+        raise HTTPException(status_code=400, detail="min_cluster_size values must be at least 2.")
+
+    try:
+        print("1. Fetching live submissions from Firestore...")
+        submissions = await asyncio.to_thread(fetch_live_submissions, get_db())
+    except Exception as e:
+        print(f"❌ Error fetching submissions: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch from Firestore.")
+
+    if not submissions:
+        print("   - No live submissions found. Nothing to preview.")
+        return {"status": "success", "message": "No live submissions to preview."}
+
+    # HDBSCAN can't form a cluster larger than the data set, and raises instead of returning all noise.
+    too_large = sorted({size for size in min_cluster_size if size > len(submissions)})
+    if too_large:
+        raise HTTPException(status_code=400,
+                            detail=f"min_cluster_size values {too_large} exceed the {len(submissions)} live submissions.")
+
+    try:
+        print("2. Analyzing submissions (preview)...")
+        # Encoding and clustering are CPU-bound, so keep them off the event loop.
+        preview = await asyncio.to_thread(run_preview, submissions, vectorizer, min_cluster_size)
+    except Exception as e:
+        print(f"❌ Error during preview analysis: {e}")
+        raise HTTPException(status_code=500, detail="An error occurred during preview analysis.")
+
+    print("✅ Preview complete. Nothing was published.")
+    return {"status": "success", "preview": preview}
@@ -0,0 +1,106 @@
+# --- Pipeline Configuration ---
+# The sentence-transformers model used to vectorize submissions.
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+# min_cluster_size is a key parameter to tune. A smaller value finds more, smaller topics.
+DEFAULT_MIN_CLUSTER_SIZE = 3
+# How many of the largest clusters become threads in a round.
+MAX_THREADS_PER_ROUND = 3
+
+
+def fetch_live_submissions(db):
+    """Returns every live submission that has both text and an author, as plain dicts."""
+    submissions = []
+    live_submissions_ref = db.collection('submissions').where('status', '==', 'live')
+    for doc in live_submissions_ref.stream():
+        doc_data = doc.to_dict()
+        # Basic validation to ensure the submission has the required data
+        if doc_data.get("submissionText") and doc_data.get("author_uid"):
+            submissions.append({
+                "id": doc.id,
+                "text": doc_data.get("submissionText"),
+                "author_uid": doc_data.get("author_uid")
+            })
+    return submissions
+
+
+def count_live_submissions_since(db, since):
+    """
+    Counts live submissions created after `since` (a timezone-aware datetime) with a
+    count() aggregation, which Firestore bills as one read per 1,000 matching documents
+    instead of one read per document.
+    Needs the (status, createdAt) composite index in firestore.indexes.json.
+    """
+    query = (db.collection('submissions')
+             .where('status', '==', 'live')
+             .where('createdAt', '>', since))
+    results = query.count(alias='new_submissions').get()
+    return int(results[0][0].value)
+
+
+def encode_texts(vectorizer, texts):
+    """Vectorizes a list of texts with the given SentenceTransformer."""
+    return vectorizer.encode(texts)
+
+
+def reduce_embeddings(embeddings, n_components=None):
+    """
+    Optionally projects embeddings onto their top principal components before clustering.
+    n_components=None (the production default) returns the embeddings unchanged.
+    """
+    if n_components is None:
+        return embeddings
+    from sklearn.decomposition import PCA  # Only the evaluation harness reduces, so don't import it up front
+    n_components = min(n_components, embeddings.shape[0], embeddings.shape[1])
+    return PCA(n_components=n_components, random_state=0).fit_transform(embeddings)
+
+
+def cluster_embeddings(embeddings, min_cluster_size=DEFAULT_MIN_CLUSTER_SIZE, min_samples=None, metric='euclidean'):
+    """
+    Clusters embeddings with HDBSCAN.
+    Returns (labels, scores): one label per row (-1 is noise) and HDBSCAN's membership strength in [0, 1].
+    """
+    import hdbscan  # Deferred: pulls in scikit-learn, which is slow to import
+
+    clusterer = hdbscan.HDBSCAN(
+        min_cluster_size=min_cluster_size,
+        min_samples=min_samples,
+        metric=metric,
+        gen_min_span_tree=True,
+    )
+    labels = clusterer.fit_predict(embeddings)
+    return labels, clusterer.probabilities_
+
+
+def group_by_cluster(submissions, labels):
+    """Groups submissions by cluster label, dropping noise points."""
+    clustered_submissions = {}
+    for i, label in enumerate(labels):
+        if label == -1:
+            continue  # Ignore noise points
+        clustered_submissions.setdefault(int(label), []).append(submissions[i])
+    return clustered_submissions
+
+
+def select_top_clusters(clustered_submissions, limit=MAX_THREADS_PER_ROUND):
+    """Returns the `limit` largest clusters as (cluster_id, submissions) pairs, largest first."""
+    sorted_clusters = sorted(clustered_submissions.items(), key=lambda item: len(item[1]), reverse=True)
+    return sorted_clusters[:limit]
+
+
+def build_prompts(submissions_in_cluster):
+    """Builds the (system_prompt, user_prompt) pair that asks the LLM to turn a cluster into a thread."""
+    # Consolidate text for the LLM prompt
+    consolidated_text = "\\n---\\n".join([sub['text'] for sub in submissions_in_cluster])
+
+    system_prompt = "You are a community moderator. Your goal is to synthesize user ideas into engaging discussion topics."
+    user_prompt = (
+        "Based on the following user thoughts, all centered on a similar theme, perform two tasks:\n"
+        "1. Create a single, neutral, open-ended discussion question that captures the core idea.\n"
+        "2. Write a short, engaging initial post to kick off the thread, referencing the collective thought.\n\n"
+        "The user thoughts are:\n"
+        "---\n"
+        f"{consolidated_text}\n"
+        "---\n\n"
+        'Format your entire response as a single, valid JSON object with two keys: "title" and "initial_post".'
+    )
+    return system_prompt, user_prompt
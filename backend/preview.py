@@ -0,0 +1,226 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import numpy as np
+
+from pipeline import (
+    EMBEDDING_MODEL_NAME,
+    encode_texts,
+    cluster_embeddings,
+    group_by_cluster,
+    select_top_clusters,
+    build_prompts,
+)
+
+# --- Preview Cache Configuration ---
+# How many snapshot directories to keep. The least recently used are deleted when a new one is created.
+MAX_CACHED_SNAPSHOTS = 5
+# How many of the strongest members to show for each chosen cluster.
+REPRESENTATIVES_PER_CLUSTER = 3
+# How many min_cluster_size values a single preview may sweep. Each one is an HDBSCAN fit and a cached file.
+MAX_MIN_CLUSTER_SIZES_PER_PREVIEW = 10
+
+# Previews run in worker threads, and two previews of the same snapshot would read, write
+# and prune the same files. Running them one at a time keeps the cache consistent.
+_preview_lock = threading.Lock()
+
+# Intermediate artifacts for preview rounds live under PREVIEW_CACHE_DIR (default '.round_cache'),
+# one sub-directory per submission snapshot:
+#   <PREVIEW_CACHE_DIR>/<snapshot_id>/
+#       snapshot.json                    ids + text fingerprint of the live submissions
+#       embeddings-<model>.npy           encode stage output
+#       clusters-<model>-mcs<N>.json     cluster stage output for min_cluster_size=N
+
+
+def snapshot_id(submissions):
+    """A stable key for a set of live submissions, derived from their sorted ids."""
+    ids = sorted(sub['id'] for sub in submissions)
+    return hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()[:16]
+
+
+def _text_fingerprint(submissions):
+    """Changes whenever any submission in the snapshot is edited, so stale embeddings are never reused."""
+    digest = hashlib.sha256()
+    for sub in sorted(submissions, key=lambda s: s['id']):
+        digest.update(sub['id'].encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(sub['text'].encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _cache_dir():
+    # Read on every call so values loaded from .env after this module was imported still apply.
+    return os.getenv("PREVIEW_CACHE_DIR", ".round_cache")
+
+
+def _prune_snapshots(cache_dir, keep):
+    """Deletes all but the `keep` most recently used snapshot directories."""
+    snapshot_dirs = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)]
+    snapshot_dirs = [path for path in snapshot_dirs if os.path.isdir(path)]
+    snapshot_dirs.sort(key=os.path.getmtime, reverse=True)
+    for stale_dir in snapshot_dirs[keep:]:
+        print(f"   - Pruning cached snapshot {os.path.basename(stale_dir)}.")
+        shutil.rmtree(stale_dir, ignore_errors=True)
+
+
+def _write_atomically(path, write, mode='w'):
+    """
+    Writes a cache file through a temporary file that is renamed into place, so a write
+    that is interrupted never leaves a truncated artifact behind.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _model_slug(model_name):
+    return model_name.replace("/", "_")
+
+
+def _prepare_snapshot_dir(submissions):
+    """Returns the cache directory for this snapshot, discarding it first if its texts have changed."""
+    cache_dir = _cache_dir()
+    snapshot_dir = os.path.join(cache_dir, snapshot_id(submissions))
+    manifest_path = os.path.join(snapshot_dir, "snapshot.json")
+    fingerprint = _text_fingerprint(submissions)
+
+    if os.path.isdir(snapshot_dir):
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        if manifest.get("text_fingerprint") == fingerprint:
+            os.utime(snapshot_dir)  # Mark as recently used so pruning keeps it
+            return snapshot_dir
+        print("   - Submission texts changed (or the snapshot's manifest is unreadable). Discarding cached artifacts.")
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    _write_atomically(manifest_path, lambda f: json.dump({
+        "submission_ids": sorted(sub['id'] for sub in submissions),
+        "text_fingerprint": fingerprint,
+    }, f, indent=4))
+    _prune_snapshots(cache_dir, keep=MAX_CACHED_SNAPSHOTS)
+    return snapshot_dir
+
+
+def _load_or_encode(snapshot_dir, vectorizer, submissions, model_name):
+    """Returns (embeddings, cache_hit). Embeddings are stored in the order of `submissions`."""
+    embeddings_path = os.path.join(snapshot_dir, f"embeddings-{_model_slug(model_name)}.npy")
+    ids_path = os.path.join(snapshot_dir, f"embeddings-{_model_slug(model_name)}.ids.json")
+    ids = [sub['id'] for sub in submissions]
+
+    if os.path.exists(embeddings_path) and os.path.exists(ids_path):
+        try:
+            with open(ids_path, 'r') as f:
+                cached_ids = json.load(f)
+            cached_embeddings = np.load(embeddings_path)
+            # Firestore doesn't guarantee stream order, so realign rows to the current order.
+            row_for_id = {sub_id: row for row, sub_id in enumerate(cached_ids)}
+            return cached_embeddings[[row_for_id[sub_id] for sub_id in ids]], True
+        except (OSError, ValueError, EOFError, KeyError, IndexError) as e:
+            print(f"   - Cached embeddings are unreadable ({e}). Re-encoding.")
+
+    embeddings = encode_texts(vectorizer, [sub['text'] for sub in submissions])
+    _write_atomically(embeddings_path, lambda f: np.save(f, embeddings), mode='wb')
+    _write_atomically(ids_path, lambda f: json.dump(ids, f))
+    return embeddings, False
+
+
+def _load_or_cluster(snapshot_dir, embeddings, submissions, model_name, min_cluster_size):
+    """Returns (artifact, cache_hit). The artifact holds labels, scores and the chosen clusters."""
+    artifact_path = os.path.join(snapshot_dir, f"clusters-{_model_slug(model_name)}-mcs{min_cluster_size}.json")
+    if os.path.exists(artifact_path):
+        try:
+            with open(artifact_path, 'r') as f:
+                return json.load(f), True
+        except (OSError, ValueError) as e:
+            print(f"   - Cached clusters for min_cluster_size={min_cluster_size} are unreadable ({e}). Re-clustering.")
+
+    labels, scores = cluster_embeddings(embeddings, min_cluster_size=min_cluster_size)
+    score_for_id = {sub['id']: float(score) for sub, score in zip(submissions, scores)}
+
+    chosen_clusters = []
+    for cluster_id, members in select_top_clusters(group_by_cluster(submissions, labels)):
+        strongest = sorted(members, key=lambda sub: score_for_id[sub['id']], reverse=True)
+        chosen_clusters.append({
+            "cluster_id": cluster_id,
+            "size": len(members),
+            "submission_ids": [sub['id'] for sub in members],
+            "representatives": [
+                {"id": sub['id'], "score": score_for_id[sub['id']], "text": sub['text']}
+                for sub in strongest[:REPRESENTATIVES_PER_CLUSTER]
+            ],
+        })
+
+    noise_count = int(np.sum(labels == -1))
+    artifact = {
+        "model": model_name,
+        "min_cluster_size": min_cluster_size,
+        "num_clusters": len(set(int(label) for label in labels) - {-1}),
+        "noise_ratio": noise_count / len(labels),
+        "labels": {sub['id']: int(label) for sub, label in zip(submissions, labels)},
+        "scores": score_for_id,
+        "chosen_clusters": chosen_clusters,
+    }
+    _write_atomically(artifact_path, lambda f: json.dump(artifact, f, indent=4))
+    return artifact, False
+
+
+def run_preview(submissions, vectorizer, min_cluster_sizes, model_name=EMBEDDING_MODEL_NAME):
+    """
+    Runs the encode and cluster stages for a snapshot of live submissions without publishing anything.
+    Embeddings are computed once per snapshot and model; clustering is only recomputed for
+    min_cluster_size values that haven't been tried on this snapshot yet.
+    Only one preview runs at a time; a second caller waits for the first to finish.
+    """
+    with _preview_lock:
+        return _run_preview(submissions, vectorizer, min_cluster_sizes, model_name)
+
+
+def _run_preview(submissions, vectorizer, min_cluster_sizes, model_name):
+    snapshot_dir = _prepare_snapshot_dir(submissions)
+    print(f"   - Snapshot {os.path.basename(snapshot_dir)} ({len(submissions)} submissions).")
+
+    embeddings, embeddings_cached = _load_or_encode(snapshot_dir, vectorizer, submissions, model_name)
+    print(f"   - Embeddings: {'reused from cache' if embeddings_cached else 'computed and cached'}.")
+
+    submissions_by_id = {sub['id']: sub for sub in submissions}
+    results = []
+    for min_cluster_size in min_cluster_sizes:
+        artifact, clusters_cached = _load_or_cluster(snapshot_dir, embeddings, submissions, model_name, min_cluster_size)
+        print(f"   - min_cluster_size={min_cluster_size}: {artifact['num_clusters']} clusters, "
+              f"{artifact['noise_ratio']:.0%} noise ({'cached' if clusters_cached else 'computed'}).")
+
+        # Prompts are rebuilt on every preview so prompt edits show up without invalidating the cache.
+        threads = []
+        for cluster in artifact["chosen_clusters"]:
+            members = [submissions_by_id[sub_id] for sub_id in cluster["submission_ids"]]
+            _, user_prompt = build_prompts(members)
+            threads.append({**cluster, "user_prompt": user_prompt})
+
+        results.append({
+            "min_cluster_size": min_cluster_size,
+            "num_clusters": artifact["num_clusters"],
+            "noise_ratio": artifact["noise_ratio"],
+            "clusters_cached": clusters_cached,
+            "threads": threads,
+        })
+
+    return {
+        "snapshot_id": os.path.basename(snapshot_dir),
+        "num_submissions": len(submissions),
+        "model": model_name,
+        "embeddings_cached": embeddings_cached,
+        "results": results,
+    }
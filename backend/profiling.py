@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import uuid
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+# --- Profiling Configuration ---
+PROFILE_MODES = ("cpu", "memory")
+# How often the CPU sampler grabs the round's stack (5ms ~= 200 samples/sec).
+CPU_SAMPLE_INTERVAL_SECONDS = 0.005
+# How many allocation sites to report for each stage in memory mode.
+TOP_ALLOCATIONS_PER_STAGE = 10
+# How many frames tracemalloc keeps per allocation, so sites can be traced back to project code.
+MEMORY_TRACEBACK_FRAMES = 25
+# How many saved profiles to keep under PROFILE_OUTPUT_DIR. The oldest are deleted when a new one is written.
+MAX_PROFILE_FILES = 20
+
+# Allocation sites are attributed to the innermost frame in this repository (backend/ and the root scripts).
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_profile_file(extension, content):
+    """
+    Saves a profile under PROFILE_OUTPUT_DIR (default 'profiles/', relative to the working directory)
+    and returns its path, or None if it couldn't be written. The directory is read on every call so
+    values loaded from .env after this module was imported still apply.
+    """
+    output_dir = os.getenv("PROFILE_OUTPUT_DIR", "profiles")
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        # The random suffix keeps two reports written in the same second from overwriting each other.
+        output_file = os.path.join(output_dir, f"round-{timestamp}-{uuid.uuid4().hex[:8]}.{extension}")
+        with open(output_file, "w") as f:
+            f.write(content)
+        print(f"   - Wrote profile to {output_file}")
+    except OSError as e:
+        print(f"   - ❌ Could not write profile: {e}")
+        return None
+    _prune_profile_files(output_dir, keep=MAX_PROFILE_FILES)
+    return output_file
+
+
+def _prune_profile_files(output_dir, keep):
+    """Deletes all but the `keep` most recently written profiles."""
+    profile_files = [os.path.join(output_dir, name) for name in os.listdir(output_dir) if name.startswith("round-")]
+    profile_files = [path for path in profile_files if os.path.isfile(path)]
+    profile_files.sort(key=os.path.getmtime, reverse=True)
+    for stale_file in profile_files[keep:]:
+        try:
+            os.remove(stale_file)
+        except OSError:
+            pass
+
+
+class NullProfiler:
+    """Stand-in used when profiling is off. Every hook is a no-op."""
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def stage(self, name):
+        return nullcontext()
+
+    def report(self):
+        return None
+
+
+class CpuProfiler:
+    """
+    A tiny sampling profiler. A background thread periodically captures the Python
+    stack of the thread running the round and counts identical stacks, tagged with
+    the pipeline stage that was active. The result is written in the "collapsed
+    stack" format understood by flamegraph.pl, speedscope and inferno.
+    """
+
+    def __init__(self, interval=CPU_SAMPLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stack_counts = {}
+        self.stage_samples = {}
+        self.total_samples = 0
+        self._current_stage = "setup"
+        self._target_thread_id = None
+        self._stop_event = threading.Event()
+        self._sampler = None
+        self._started_at = None
+        self._duration = 0.0
+
+    def start(self):
+        self._target_thread_id = threading.get_ident()
+        self._started_at = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample_loop, name="round-cpu-sampler", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        if self._sampler is None:
+            return
+        self._stop_event.set()
+        self._sampler.join()
+        self._sampler = None
+        self._duration = time.perf_counter() - self._started_at
+
+    @contextmanager
+    def stage(self, name):
+        previous_stage = self._current_stage
+        self._current_stage = name
+        try:
+            yield
+        finally:
+            self._current_stage = previous_stage
+
+    def _sample_loop(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is None:
+                continue
+
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+
+            stage = self._current_stage
+            frames.append(f"stage:{stage}")
+            collapsed = ";".join(reversed(frames))
+
+            self.stack_counts[collapsed] = self.stack_counts.get(collapsed, 0) + 1
+            self.stage_samples[stage] = self.stage_samples.get(stage, 0) + 1
+            self.total_samples += 1
+
+    def collapsed_stacks(self):
+        """Returns the samples as 'frame;frame;frame count' lines."""
+        return "\n".join(f"{stack} {count}" for stack, count in sorted(self.stack_counts.items()))
+
+    def report(self):
+        collapsed = self.collapsed_stacks()
+        output_file = write_profile_file("collapsed", collapsed + "\n")
+
+        return {
+            "mode": "cpu",
+            "duration_seconds": round(self._duration, 3),
+            "sample_interval_ms": self.interval * 1000,
+            "total_samples": self.total_samples,
+            "samples_per_stage": self.stage_samples,
+            "collapsed_stacks_file": output_file,
+            "collapsed_stacks": collapsed,
+        }
+
+
+class MemoryProfiler:
+    """
+    Traces Python allocations with tracemalloc and reports, for each pipeline stage,
+    how far traced memory peaked above its starting point and the source lines
+    that allocated the most. Each site is the innermost line of project code on the
+    allocating stack (e.g. the encode_texts() call), with the library line that did
+    the actual allocation alongside it.
+    A stage entered several times (e.g. once per cluster) is aggregated.
+    tracemalloc traces the whole process, so allocations made by other requests served
+    during the round are counted too; the preview endpoint refuses to run meanwhile.
+    """
+
+    def __init__(self, top_n=TOP_ALLOCATIONS_PER_STAGE):
+        self.top_n = top_n
+        self.stages = {}
+        self._started_tracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACEBACK_FRAMES)
+            self._started_tracing = True
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextmanager
+    def stage(self, name):
+        before = self._snapshot()
+        tracemalloc.reset_peak()
+        start_bytes, _ = tracemalloc.get_traced_memory()
+        try:
+            yield
+        finally:
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            after = self._snapshot()
+            stats = self.stages.setdefault(name, {"peak_increase_bytes": 0, "sites": {}})
+            stats["peak_increase_bytes"] = max(stats["peak_increase_bytes"], peak_bytes - start_bytes)
+            for diff in after.compare_to(before, "traceback"):
+                if diff.size_diff <= 0:
+                    continue
+                site = _project_site(diff.traceback)
+                size, count = stats["sites"].get(site, (0, 0))
+                stats["sites"][site] = (size + diff.size_diff, count + diff.count_diff)
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__, all_frames=True),  # The snapshots taken by stage() itself
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def report(self):
+        stages = {}
+        for name, stats in self.stages.items():
+            top_sites = sorted(stats["sites"].items(), key=lambda item: item[1][0], reverse=True)[:self.top_n]
+            stages[name] = {
+                "peak_increase_bytes": stats["peak_increase_bytes"],
+                "top_allocations": [
+                    {"site": site, "size_diff_bytes": size, "count_diff": count}
+                    for site, (size, count) in top_sites
+                ],
+            }
+        report = {
+            "mode": "memory",
+            "note": "tracemalloc traces the whole process: allocations by other requests served during the round are included.",
+            "stages": stages,
+        }
+        report["report_file"] = write_profile_file("memory.json", json.dumps(report, indent=4))
+        return report
+
+
+def _project_site(traceback):
+    """
+    Returns 'project_file:line (in library_file:line)' for the innermost frame of project
+    code on an allocation's stack, or just the innermost frame if no project code is on it.
+    """
+    # tracemalloc orders frames from the oldest to the most recent call.
+    innermost = f"{traceback[-1].filename}:{traceback[-1].lineno}"
+    frames = list(traceback)
+    for depth, frame in enumerate(reversed(frames)):
+        if frame.filename.startswith(PROJECT_DIR) and "site-packages" not in frame.filename:
+            project_line = f"{os.path.relpath(frame.filename, PROJECT_DIR)}:{frame.lineno}"
+            return project_line if depth == 0 else f"{project_line} (in {innermost})"
+    return innermost
+
+
+def make_profiler(mode):
+    """Returns the profiler for the requested mode, or a no-op profiler when mode is None."""
+    if mode is None:
+        return NullProfiler()
+    if mode == "cpu":
+        return CpuProfiler()
+    if mode == "memory":
+        return MemoryProfiler()
+    raise ValueError(f"Unknown profile mode '{mode}'. Expected one of: {', '.join(PROFILE_MODES)}.")
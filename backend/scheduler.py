@@ -0,0 +1,159 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from croniter import croniter
+
+
+class RoundInProgressError(Exception):
+    """Raised when a round is requested while another one is still running."""
+
+
+class RoundScheduler:
+    """
+    Runs generation rounds one at a time, and optionally starts them in the background.
+
+    Every round, manual or scheduled, goes through run_round(), which refuses to start
+    while another round holds the lock. When enabled, a background loop polls every
+    `poll_seconds` and starts a round when either:
+      - the cron schedule comes due and there is at least one new live submission, or
+      - the number of new live submissions reaches `new_submissions_threshold`
+        (at most once every `min_gap_seconds`, counted from startup before the first round).
+    A trigger that finds a round already running is deferred. Once that round finishes, the
+    deferred trigger's own condition (at least one new submission for cron, the threshold for
+    the threshold trigger) and the minimum gap are re-checked before starting anything, so a
+    round isn't repeated just to re-cluster what the running one left behind. Every scheduled
+    start is delayed by a random jitter of up to `jitter_seconds`.
+    """
+
+    def __init__(self, scheduled_round, count_new_submissions, cron=None, new_submissions_threshold=0,
+                 poll_seconds=60, jitter_seconds=30, min_gap_seconds=300):
+        self.scheduled_round = scheduled_round
+        self.count_new_submissions = count_new_submissions
+        self.cron = cron
+        self.new_submissions_threshold = new_submissions_threshold
+        self.poll_seconds = poll_seconds
+        self.jitter_seconds = jitter_seconds
+        self.min_gap_seconds = min_gap_seconds
+
+        self.last_round_at = None
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._started_at = time.time()
+        self._next_cron_at = None
+        self._deferred_trigger = None  # "cron" or "threshold" while a trigger waits for a running round
+
+        if self.cron and not croniter.is_valid(self.cron):
+            print(f"❌ Invalid ROUND_SCHEDULE_CRON '{self.cron}'. Cron scheduling is disabled.")
+            self.cron = None
+
+    @property
+    def enabled(self):
+        return bool(self.cron) or self.new_submissions_threshold > 0
+
+    @property
+    def round_running(self):
+        return self._lock.locked()
+
+    async def run_round(self, round_func, *args):
+        """Runs round_func(*args) in a worker thread, unless a round is already running."""
+        if self._lock.locked():
+            raise RoundInProgressError("A generation round is already running.")
+        async with self._lock:
+            try:
+                return await asyncio.to_thread(round_func, *args)
+            finally:
+                self.last_round_at = time.time()
+
+    def start(self):
+        if not self.enabled:
+            print("🗓️ Round scheduler disabled (set ROUND_SCHEDULE_CRON and/or ROUND_NEW_SUBMISSIONS_THRESHOLD).")
+            return
+        self._started_at = time.time()
+        if self.cron:
+            self._next_cron_at = self._next_cron_time()
+        print(f"🗓️ Round scheduler started (cron: {self.cron or 'off'}, "
+              f"new submissions threshold: {self.new_submissions_threshold or 'off'}).")
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _within_min_gap(self):
+        """True if the last round (or, before any round, the scheduler's start) was too recent."""
+        reference = self.last_round_at if self.last_round_at is not None else self._started_at
+        return time.time() - reference < self.min_gap_seconds
+
+    def _next_cron_time(self):
+        return croniter(self.cron, datetime.now(timezone.utc)).get_next(float)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                triggered = await self._check_triggers()
+                if triggered:
+                    await self._start_scheduled_round(*triggered)
+            except Exception as e:
+                # Never let one bad poll (e.g. a Firestore hiccup) kill the scheduler.
+                print(f"❌ Round scheduler error: {e}")
+
+    def _trigger_condition_met(self, trigger, new_submissions):
+        if trigger == "cron":
+            return new_submissions > 0
+        return bool(self.new_submissions_threshold) and new_submissions >= self.new_submissions_threshold
+
+    async def _check_triggers(self):
+        """Returns (trigger, reason) if a round should start now, where trigger is "cron" or "threshold", or None."""
+        if self._deferred_trigger and self.round_running:
+            return None  # Still waiting for the round that caused the deferral
+
+        cron_due = self._next_cron_at is not None and time.time() >= self._next_cron_at
+        if not cron_due and not self.new_submissions_threshold and not self._deferred_trigger:
+            return None
+
+        new_submissions = await asyncio.to_thread(self.count_new_submissions)
+
+        if cron_due:
+            self._next_cron_at = self._next_cron_time()
+            if self._trigger_condition_met("cron", new_submissions):
+                return "cron", f"cron schedule ({new_submissions} new submissions)"
+            print("🗓️ Scheduled round skipped: no new live submissions since the last round.")
+
+        if self._deferred_trigger:
+            trigger = self._deferred_trigger
+            if not self._trigger_condition_met(trigger, new_submissions):
+                print(f"🗓️ Deferred {trigger} round dropped: the round that was running already handled the new submissions.")
+                self._deferred_trigger = None
+                return None
+            if self._within_min_gap():
+                return None
+            return trigger, f"deferred {trigger} trigger ({new_submissions} new submissions)"
+
+        if self._trigger_condition_met("threshold", new_submissions):
+            if self._within_min_gap():
+                return None
+            return "threshold", f"{new_submissions} new submissions (threshold {self.new_submissions_threshold})"
+
+        return None
+
+    async def _start_scheduled_round(self, trigger, reason):
+        # Jitter spreads scheduled rounds so they don't line up with other periodic load.
+        await asyncio.sleep(random.uniform(0, self.jitter_seconds))
+
+        try:
+            print(f"🗓️ Scheduler starting a round: {reason}.")
+            self._deferred_trigger = None
+            await self.run_round(self.scheduled_round)
+        except RoundInProgressError:
+            print(f"🗓️ A round is already running. Deferring the {trigger} trigger until it finishes.")
+            self._deferred_trigger = trigger
+        except Exception as e:
+            print(f"❌ Scheduled round failed: {e}")
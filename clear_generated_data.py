@@ -18,35 +18,11 @@
 # ==============================================================================
 
 import os
-import json
-import firebase_admin
-from firebase_admin import credentials, firestore
-from dotenv import load_dotenv
+import sys
 
-# --- Load environment variables from .env file ---
-load_dotenv()
-
-# --- Initialize Firebase Admin SDK ---
-# This initialization logic is robust for both local and deployed environments.
-try:
-    print("Initializing Firebase...")
-    service_account_json_str = os.getenv("FIREBASE_SERVICE_ACCOUNT_JSON")
-    if service_account_json_str:
-        service_account_info = json.loads(service_account_json_str)
-        cred = credentials.Certificate(service_account_info)
-    else:
-        if not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
-             raise ValueError("GOOGLE_APPLICATION_CREDENTIALS not set for local development.")
-        cred = credentials.ApplicationDefault()
-
-    if not firebase_admin._apps:
-        firebase_admin.initialize_app(cred)
-    print("✅ Firebase initialized successfully.")
-except Exception as e:
-    print(f"❌ Error initializing Firebase: {e}")
-    exit()
-
-db = firestore.client()
+# The Firestore client comes from the backend's shared, lazily-initialized bootstrap.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from bootstrap import get_db
 
 def delete_collection(coll_ref, batch_size):
     """Recursively deletes a collection in batches."""
@@ -69,6 +45,7 @@ def delete_collection(coll_ref, batch_size):
 def reset_user_submissions():
     """Sets live_submission_id to None for all users who have one."""
     print("\n4. Resetting user submission statuses...")
+    db = get_db()
     users_ref = db.collection('users').where('live_submission_id', '!=', None)
     docs = users_ref.stream()
     
@@ -101,6 +78,12 @@ def main():
         print("Operation cancelled.")
         return
 
+    try:
+        db = get_db()
+    except Exception as e:
+        print(f"❌ Error initializing Firebase: {e}")
+        return
+
     # --- Delete public_threads ---
     print("\n1. Deleting 'public_threads' collection...")
     threads_ref = db.collection('public_threads')
@@ -22,46 +22,29 @@
 # ==============================================================================
 
 import os
+import sys
 import json
-import firebase_admin
-from firebase_admin import credentials, auth, firestore
 from faker import Faker
-from dotenv import load_dotenv
 
-# --- Load environment variables from .env file ---
-load_dotenv()
+# The Firestore client comes from the backend's shared, lazily-initialized bootstrap.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from bootstrap import get_db, get_auth
 
 # --- Configuration ---
 NUM_USERS_TO_CREATE = 50
 OUTPUT_FILE = 'fake_users.json'
 
-# --- Initialize Firebase Admin SDK ---
-try:
-    print("Initializing Firebase for user creation script...")
-    service_account_json_str = os.getenv("FIREBASE_SERVICE_ACCOUNT_JSON")
-    if service_account_json_str:
-        # Production-style: From environment variable
-        print("   - Using service account from environment variable.")
-        service_account_info = json.loads(service_account_json_str)
-        cred = credentials.Certificate(service_account_info)
-    else:
-        # Development-style: From local file path in .env
-        print("   - Using service account from local file path (GOOGLE_APPLICATION_CREDENTIALS).")
-        if not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
-             raise ValueError("GOOGLE_APPLICATION_CREDENTIALS not set for local development.")
-        cred = credentials.ApplicationDefault()
-
-    firebase_admin.initialize_app(cred)
-    print("✅ Firebase initialized successfully.")
-except Exception as e:
-    print(f"❌ Error initializing Firebase: {e}")
-    exit()
-
-db = firestore.client()
 fake = Faker()
 
 def create_users():
     """Creates fake users in Firebase Auth and Firestore."""
+    try:
+        db = get_db()
+        auth = get_auth()
+    except Exception as e:
+        print(f"❌ Error initializing Firebase: {e}")
+        return
+
     users_data = []
     print(f"Starting creation of {NUM_USERS_TO_CREATE} fake users...")
 
@@ -0,0 +1,202 @@
+# ==============================================================================
+# SCRIPT: evaluate_clustering.py
+#
+# PURPOSE:
+# This script measures how well, and how fast, the backend's encode/cluster
+# stages recover the topics of a labelled corpus. generate_submissions.py
+# records which SUBMISSION_CONFIG topic every submission was generated from
+# in 'generated_submissions_log.json'; this script replays those texts through
+# backend/pipeline.py for every combination of embedding model, dimensionality
+# reduction and HDBSCAN parameters configured below, and reports ARI/NMI,
+# noise ratio, runtime and memory side by side. Memory is reported as the peak
+# RSS of loading and running each model (measured in a separate process per
+# model) and the peak Python-level memory of reduction + clustering.
+#
+# Nothing is read from or written to Firestore, and no LLM calls are made.
+#
+# PREREQUISITES:
+# 1. Run generate_submissions.py at least once to produce a labelled log file.
+#    (Logs written before topics were recorded have no 'topic' field and are skipped.)
+# 2. Install the backend requirements:
+#    pip install -r backend/requirements.txt
+#
+# USAGE:
+# python evaluate_clustering.py [log_file.json ...]
+# ==============================================================================
+
+import os
+import sys
+import json
+import time
+import resource
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# The encode/cluster stages are shared with the backend so we evaluate exactly what runs in production.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from bootstrap import get_vectorizer
+from pipeline import EMBEDDING_MODEL_NAME, DEFAULT_MIN_CLUSTER_SIZE, encode_texts, reduce_embeddings, cluster_embeddings
+
+# --- Configuration ---
+# Labelled corpora to evaluate. Several logs (e.g. from different SUBMISSION_CONFIGs) are combined.
+CORPUS_FILES = ['generated_submissions_log.json']
+
+# Every combination of the settings below is evaluated.
+EVAL_MODELS = [
+    EMBEDDING_MODEL_NAME,          # Production model
+    'paraphrase-MiniLM-L3-v2',     # Smaller and faster
+    'all-mpnet-base-v2',           # Larger and slower
+]
+# Number of PCA components to keep before clustering. None means no reduction (production).
+REDUCTION_SETTINGS = [None, 32, 8]
+HDBSCAN_SETTINGS = [
+    {"min_cluster_size": DEFAULT_MIN_CLUSTER_SIZE},  # Production parameters
+    {"min_cluster_size": DEFAULT_MIN_CLUSTER_SIZE, "min_samples": 1},
+    {"min_cluster_size": 5},
+]
+
+RESULTS_FILE = 'clustering_eval_results.json'
+
+
+def load_labelled_corpus(corpus_files):
+    """Returns (texts, topics) from the given submission logs, skipping entries without a topic."""
+    texts, topics = [], []
+    for path in corpus_files:
+        try:
+            with open(path, 'r') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            print(f"Warning: {path} not found. Skipping.")
+            continue
+
+        unlabelled = 0
+        for entry in entries:
+            if not entry.get('topic') or not entry.get('generated_text'):
+                unlabelled += 1
+                continue
+            texts.append(entry['generated_text'])
+            topics.append(entry['topic'])
+
+        print(f"Loaded {len(entries) - unlabelled} labelled submissions from {path}.")
+        if unlabelled:
+            print(f"  - Skipped {unlabelled} entries without a topic (logged before topics were recorded).")
+    return texts, topics
+
+
+def load_and_encode(model_name, texts):
+    """
+    Loads a model and encodes the corpus. Meant to run in a fresh process, so the process's
+    peak RSS covers exactly this model's load and encode (torch memory included, which
+    tracemalloc can't see). Returns (embeddings, encode_seconds, peak_rss_bytes).
+    """
+    vectorizer = get_vectorizer(model_name)
+
+    # The first call warms the model up so load time isn't counted as encode time.
+    encode_texts(vectorizer, texts[:1])
+    start = time.perf_counter()
+    embeddings = encode_texts(vectorizer, texts)
+    encode_seconds = time.perf_counter() - start
+
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_bytes = peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+    return embeddings, encode_seconds, peak_rss_bytes
+
+
+def time_and_trace(func, *args, **kwargs):
+    """
+    Runs func twice: once untraced to time it, and once under tracemalloc to find its peak
+    Python-level memory (numpy buffers are traced; torch tensors are not).
+    Returns (result, seconds, peak_bytes).
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(*args, **kwargs)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak_bytes
+
+
+def evaluate():
+    """Runs every configured combination and prints a comparison table."""
+    # Imported here rather than at the top so the per-model encode processes, which re-import
+    # this module, don't load scikit-learn. hdbscan is imported now so its import time isn't
+    # counted in the first clustering measurement.
+    from sklearn.metrics import adjusted_rand_score, normalized_mutual_info_score
+    import hdbscan  # noqa: F401
+
+    corpus_files = sys.argv[1:] or CORPUS_FILES
+    texts, topics = load_labelled_corpus(corpus_files)
+    if not texts:
+        print("No labelled submissions found. Run generate_submissions.py first.")
+        return
+
+    num_topics = len(set(topics))
+    print(f"Evaluating on {len(texts)} submissions across {num_topics} topics.\n")
+
+    results = []
+    for model_name in EVAL_MODELS:
+        print(f"--- Encoding with '{model_name}' ---")
+        # Encode once per model, in its own process so each model's peak memory is measured
+        # separately; every reduction/HDBSCAN setting reuses these embeddings.
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                embeddings, encode_seconds, encode_peak_rss = pool.submit(load_and_encode, model_name, texts).result()
+        except Exception as e:
+            print(f"  - Could not load model or encode: {e}")
+            continue
+        print(f"  - Encoded in {encode_seconds:.2f}s ({embeddings.shape[1]} dimensions, "
+              f"peak RSS {encode_peak_rss / 1e6:.0f} MB).")
+
+        for n_components in REDUCTION_SETTINGS:
+            reduced, reduce_seconds, reduce_peak = time_and_trace(reduce_embeddings, embeddings, n_components)
+
+            for hdbscan_params in HDBSCAN_SETTINGS:
+                try:
+                    (labels, _), cluster_seconds, cluster_peak = time_and_trace(cluster_embeddings, reduced, **hdbscan_params)
+                except Exception as e:
+                    print(f"  - Clustering failed for reduction={n_components}, {hdbscan_params}: {e}")
+                    continue
+
+                # Noise points keep the -1 label, so a configuration that discards most
+                # submissions as noise is penalized rather than scored only on what it kept.
+                results.append({
+                    "model": model_name,
+                    "reduction": n_components,
+                    "hdbscan": hdbscan_params,
+                    "ari": adjusted_rand_score(topics, labels),
+                    "nmi": normalized_mutual_info_score(topics, labels),
+                    "num_clusters": len(set(labels) - {-1}),
+                    "noise_ratio": float((labels == -1).mean()),
+                    "encode_seconds": encode_seconds,
+                    "encode_peak_rss_bytes": encode_peak_rss,
+                    "cluster_seconds": reduce_seconds + cluster_seconds,
+                    "cluster_peak_bytes": max(reduce_peak, cluster_peak),
+                })
+
+    print_results(results, num_topics)
+
+    with open(RESULTS_FILE, 'w') as f:
+        json.dump({"corpus_files": corpus_files, "num_submissions": len(texts), "num_topics": num_topics,
+                   "results": results}, f, indent=4)
+    print(f"\n✅ Saved {len(results)} results to {RESULTS_FILE}.")
+
+
+def print_results(results, num_topics):
+    """Prints the results as a table, best ARI first. 'encode MB' is peak process RSS while loading and encoding."""
+    print(f"\n{'model':<26} {'reduce':>6} {'hdbscan':<32} {'ARI':>6} {'NMI':>6} {'clusters':>8} {'noise':>6} "
+          f"{'encode s':>9} {'encode MB':>9} {'cluster s':>9} {'cluster MB':>10}")
+    for r in sorted(results, key=lambda r: r["ari"], reverse=True):
+        params = ", ".join(f"{key}={value}" for key, value in r["hdbscan"].items())
+        print(f"{r['model']:<26} {str(r['reduction'] or '-'):>6} {params:<32} {r['ari']:>6.3f} {r['nmi']:>6.3f} "
+              f"{r['num_clusters']:>4}/{num_topics:<3} {r['noise_ratio']:>6.0%} "
+              f"{r['encode_seconds']:>9.2f} {r['encode_peak_rss_bytes'] / 1e6:>9.0f} "
+              f"{r['cluster_seconds']:>9.3f} {r['cluster_peak_bytes'] / 1e6:>10.1f}")
+
+
+if __name__ == '__main__':
+    evaluate()
@@ -23,16 +23,14 @@
 # ==============================================================================
 
 import os
+import sys
 import json
 import random
 import time
-import firebase_admin
-from firebase_admin import credentials, firestore
-import openai
-from dotenv import load_dotenv
 
-# --- Load environment variables from .env file ---
-load_dotenv()
+# Firebase and OpenAI clients come from the backend's shared, lazily-initialized bootstrap.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from bootstrap import get_db, get_openai_client, get_server_timestamp
 
 # --- Configuration ---
 # Define the topics and how many users should post about each.
@@ -57,49 +55,13 @@ SUBMISSION_CONFIG = {
 INPUT_USER_FILE = 'fake_users.json'
 SUBMISSIONS_LOG_FILE = 'generated_submissions_log.json'
 
-# --- Initialize Firebase Admin SDK ---
-if not firebase_admin._apps:
-    try:
-        print("Initializing Firebase for submission generation script...")
-        service_account_json_str = os.getenv("FIREBASE_SERVICE_ACCOUNT_JSON")
-        if service_account_json_str:
-            # Production-style: From environment variable
-            print("   - Using service account from environment variable.")
-            service_account_info = json.loads(service_account_json_str)
-            cred = credentials.Certificate(service_account_info)
-        else:
-            # Development-style: From local file path in .env
-            print("   - Using service account from local file path (GOOGLE_APPLICATION_CREDENTIALS).")
-            if not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
-                raise ValueError("GOOGLE_APPLICATION_CREDENTIALS not set for local development.")
-            cred = credentials.ApplicationDefault()
-
-        firebase_admin.initialize_app(cred)
-        print("✅ Firebase initialized successfully.")
-    except Exception as e:
-        print(f"❌ Error initializing Firebase: {e}")
-        exit()
-
-# --- Initialize OpenAI API ---
-try:
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    if not openai.api_key:
-        raise ValueError("OPENAI_API_KEY environment variable not found in .env file.")
-    print("OpenAI API initialized successfully.")
-except Exception as e:
-    print(f"Error initializing OpenAI API: {e}")
-    exit()
-
-
-db = firestore.client()
-
 def get_llm_generated_submission(topic):
     """Generates a unique, user-like submission for a given topic using the OpenAI API."""
     system_prompt = "You are a person interested in debating intellectual topics, visiting an online discussion forum. Your task is to write a short submission (1 or 2 sentences) for a discussion topic. These submissions will be private and anonymous, but used to decide on duscussion topics for the entire forum. Make it sound like a real, informal user post. Vary the phrasing and tone slightly. Do not use hashtags or overly formal language. Text before BEGIN_POST represents your own private thoughts. You should express you thoughts after BEGIN_POST as if you were telling someone, unprompted, about an idea you are interested in discussing."
     user_prompt = f"The topic I'm thinking about is: '{topic}' BEGIN_POST"
 
     try:
-        response = openai.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -117,6 +79,13 @@ def get_llm_generated_submission(topic):
 
 def generate_and_submit():
     """Assigns topics to users and generates/submits their topic ideas."""
+    try:
+        db = get_db()
+        get_openai_client()
+    except Exception as e:
+        print(f"❌ Error initializing Firebase/OpenAI: {e}")
+        return
+
     # 1. Load the fake users
     try:
         with open(INPUT_USER_FILE, 'r') as f:
@@ -159,8 +128,8 @@ def generate_and_submit():
                 submission_data = {
                     'author_uid': uid,
                     'submissionText': submission_text,
-                    'createdAt': firestore.SERVER_TIMESTAMP,
-                    'lastEdited': firestore.SERVER_TIMESTAMP,
+                    'createdAt': get_server_timestamp(),
+                    'lastEdited': get_server_timestamp(),
                     'status': 'live'
                 }
                 batch.set(submission_ref, submission_data)
@@ -178,6 +147,7 @@ def generate_and_submit():
                     'username': username,
                     'uid': uid,
                     'submission_id': submission_ref.id,
+                    'topic': topic,  # Ground-truth label, used by evaluate_clustering.py
                     'generated_text': submission_text
                 })
 
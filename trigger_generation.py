@@ -1,4 +1,6 @@
 import os
+import sys
+import json
 import requests
 from dotenv import load_dotenv
 
@@ -23,8 +25,11 @@ else:
     API_BASE_URL = RAILWAY_URL
     print("--- 🚀 USING PRODUCTION RAILWAY SERVER ---")
 
-def trigger_backend_process():
-    """Sends a secure POST request to the configured backend to start the process."""
+def trigger_backend_process(profile=None):
+    """
+    Sends a secure POST request to the configured backend to start the process.
+    If profile is 'cpu' or 'memory', the round runs under that profiler and the report is saved locally.
+    """
     if not API_BASE_URL or not SECRET_KEY:
         print("Error: Please set required environment variables (SECRET_KEY and either RAILWAY_APP_URL or USE_DEV_SERVER).")
         return
@@ -34,21 +39,57 @@ def trigger_backend_process():
         "X-API-Key": SECRET_KEY
     }
 
+    params = {"profile": profile} if profile else None
+
     print(f"🚀 Triggering backend process at: {endpoint}")
+    if profile:
+        print(f"⏱️ Requesting a '{profile}' profile of the round.")
 
     try:
-        response = requests.post(endpoint, headers=headers, timeout=30)
+        # A profiled round runs slower (especially under tracemalloc), so don't cut it off.
+        response = requests.post(endpoint, headers=headers, params=params, timeout=None if profile else 30)
 
         if response.status_code == 200:
             print("✅ Success! Backend process started.")
-            print("Server response:", response.json())
+            result = response.json()
+            profile_report = result.pop("profile", None)
+            print("Server response:", result)
+            if profile_report:
+                save_profile_report(profile_report)
         else:
             print(f"❌ Error: Failed to trigger process.")
             print(f"Status Code: {response.status_code}")
-            print("Server response:", response.text)
+            detail = _json_or_none(response)
+            detail = detail.get("detail") if isinstance(detail, dict) else None
+            if isinstance(detail, dict) and detail.get("profile"):
+                print("Server response:", detail.get("message"))
+                save_profile_report(detail["profile"])
+            else:
+                print("Server response:", response.text)
 
     except requests.exceptions.RequestException as e:
         print(f"❌ A network error occurred: {e}")
 
+def _json_or_none(response):
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+def save_profile_report(profile_report):
+    """Writes a profile returned by the backend to the current directory."""
+    if profile_report.get("mode") == "cpu":
+        output_file = "round_profile.collapsed"
+        with open(output_file, "w") as f:
+            f.write(profile_report["collapsed_stacks"] + "\n")
+        print(f"📄 Saved collapsed stacks to {output_file} (samples per stage: {profile_report['samples_per_stage']}).")
+        print("   - View it with e.g. `flamegraph.pl round_profile.collapsed > round.svg` or https://www.speedscope.app")
+    else:
+        output_file = "round_profile_memory.json"
+        with open(output_file, "w") as f:
+            json.dump(profile_report, f, indent=4)
+        print(f"📄 Saved top allocation sites per stage to {output_file}.")
+
 if __name__ == "__main__":
-    trigger_backend_process() 
+    # Optional: `python trigger_generation.py cpu` or `python trigger_generation.py memory`
+    trigger_backend_process(sys.argv[1] if len(sys.argv) > 1 else None)